@@ -7,9 +7,9 @@ describe: 缠论分型、笔的识别
 """
 import os
 import webbrowser
+from bisect import bisect_left
 from loguru import logger
 from typing import List
-from collections import OrderedDict
 from czsc.enum import Mark, Direction
 from czsc.objects import BI, FX, RawBar, NewBar
 from czsc.utils.echarts_plot import kline_pro
@@ -37,27 +37,28 @@ def remove_include(k1: NewBar, k2: NewBar, k3: RawBar):
 
     4. 返回一个布尔值和新的K线k4。如果k2和k3之间存在包含关系，则返回True和k4；否则返回False和k4，其中k4与k3具有相同的属性。
     """
-    if k1.high < k2.high:
+    h2, l2, h3, l3 = k2.high, k2.low, k3.high, k3.low
+    if k1.high < h2:
         direction = Direction.Up
-    elif k1.high > k2.high:
+    elif k1.high > h2:
         direction = Direction.Down
     else:
         k4 = NewBar(symbol=k3.symbol, id=k3.id, freq=k3.freq, dt=k3.dt, open=k3.open,
-                    close=k3.close, high=k3.high, low=k3.low, vol=k3.vol, amount=k3.amount, elements=[k3])
+                    close=k3.close, high=h3, low=l3, vol=k3.vol, amount=k3.amount, elements=[k3])
         return False, k4
 
-    # 判断 k2 和 k3 之间是否存在包含关系，有则处理
-    if (k2.high <= k3.high and k2.low >= k3.low) or (k2.high >= k3.high and k2.low <= k3.low):
+    # 判断 k2 和 k3 之间是否存在包含关系，有则处理；高点差与低点差异号（或有一个为0）即为包含
+    if (h2 - h3) * (l2 - l3) <= 0:
 
         if direction == Direction.Up:
-            high = max(k2.high, k3.high)
-            low = max(k2.low, k3.low)
-            dt = k2.dt if k2.high > k3.high else k3.dt
+            high = max(h2, h3)
+            low = max(l2, l3)
+            dt = k2.dt if h2 > h3 else k3.dt
 
         elif direction == Direction.Down:
-            high = min(k2.high, k3.high)
-            low = min(k2.low, k3.low)
-            dt = k2.dt if k2.low < k3.low else k3.dt
+            high = min(h2, h3)
+            low = min(l2, l3)
+            dt = k2.dt if l2 < l3 else k3.dt
 
         else:
             raise ValueError
@@ -68,14 +69,18 @@ def remove_include(k1: NewBar, k2: NewBar, k3: RawBar):
 
         # 这里有一个隐藏Bug，len(k2.elements) 在一些及其特殊的场景下会有超大的数量，具体问题还没找到；
         # 临时解决方案是直接限定len(k2.elements)<=100
-        elements = [x for x in k2.elements[:100] if x.dt != k3.dt] + [k3]
+        # K线按时间升序排列，只有最后一个元素可能与 k3 的时间相同，不需要逐个比较
+        elements = k2.elements[:100]
+        if elements and elements[-1].dt == k3.dt:
+            elements.pop()
+        elements.append(k3)
         k4 = NewBar(symbol=k3.symbol, id=k2.id, freq=k2.freq, dt=dt, open=open_,
                     close=close, high=high, low=low, vol=vol, amount=amount, elements=elements)
         return True, k4
 
     else:
         k4 = NewBar(symbol=k3.symbol, id=k3.id, freq=k3.freq, dt=k3.dt, open=k3.open,
-                    close=k3.close, high=k3.high, low=k3.low, vol=k3.vol, amount=k3.amount, elements=[k3])
+                    close=k3.close, high=h3, low=l3, vol=k3.vol, amount=k3.amount, elements=[k3])
         return False, k4
 
 
@@ -98,18 +103,19 @@ def check_fx(k1: NewBar, k2: NewBar, k3: NewBar):
     :return: `FX`对象或`None`
     """
     fx = None
-    if k1.high < k2.high > k3.high and k1.low < k2.low > k3.low:
-        fx = FX(symbol=k1.symbol, dt=k2.dt, mark=Mark.G, high=k2.high,
-                low=k2.low, fx=k2.high, elements=[k1, k2, k3])
+    h2, l2 = k2.high, k2.low
+    if k1.high < h2 > k3.high and k1.low < l2 > k3.low:
+        fx = FX(symbol=k1.symbol, dt=k2.dt, mark=Mark.G, high=h2,
+                low=l2, fx=h2, elements=[k1, k2, k3])
 
-    if k1.low > k2.low < k3.low and k1.high > k2.high < k3.high:
-        fx = FX(symbol=k1.symbol, dt=k2.dt, mark=Mark.D, high=k2.high,
-                low=k2.low, fx=k2.low, elements=[k1, k2, k3])
+    elif k1.low > l2 < k3.low and k1.high > h2 < k3.high:
+        fx = FX(symbol=k1.symbol, dt=k2.dt, mark=Mark.D, high=h2,
+                low=l2, fx=l2, elements=[k1, k2, k3])
 
     return fx
 
 
-def check_fxs(bars: List[NewBar]) -> List[FX]:
+def check_fxs(bars: List[NewBar], fxs: List[FX] = None) -> List[FX]:
     """输入一串无包含关系K线，查找其中所有分型
 
     函数的主要步骤：
@@ -123,12 +129,14 @@ def check_fxs(bars: List[NewBar]) -> List[FX]:
     这个函数的主要目的是找出`bars`列表中所有的顶分型和底分型，并确保它们是交替出现的。如果发现连续的两个分型标记相同，它会记录一个错误日志。
 
     :param bars: 无包含关系K线列表
+    :param fxs: 已经找到的分型列表，用于增量查找，新找到的分型会追加到这个列表中；
+        默认为 None，从空列表开始查找
     :return: 分型列表
     """
-    fxs = []
+    fxs = [] if fxs is None else fxs
     for i in range(1, len(bars) - 1):
         fx = check_fx(bars[i - 1], bars[i], bars[i + 1])
-        if isinstance(fx, FX):
+        if fx is not None:
             # 默认情况下，fxs本身是顶底交替的，但是对于一些特殊情况下不是这样; 临时强制要求fxs序列顶底交替
             if len(fxs) >= 2 and fx.mark == fxs[-1].mark:
                 logger.error(f"check_fxs错误: {bars[i].dt}，{fx.mark}，{fxs[-1].mark}")
@@ -137,14 +145,33 @@ def check_fxs(bars: List[NewBar]) -> List[FX]:
     return fxs
 
 
-def check_bi(bars: List[NewBar], **kwargs):
+def _bisect_dt(bars: List[NewBar], dt, right=False) -> int:
+    """在按时间升序排列的K线序列中二分查找 dt 的插入位置
+
+    :param bars: 按时间升序排列的K线列表
+    :param dt: 查找的时间
+    :param right: 为 True 时，返回最后一根 bar.dt <= dt 之后的位置；否则返回第一根 bar.dt >= dt 的位置
+    :return: 插入位置
+    """
+    lo, hi = 0, len(bars)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if bars[mid].dt < dt or (right and bars[mid].dt == dt):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def check_bi(bars: List[NewBar], fxs: List[FX] = None, **kwargs):
     """输入一串无包含关系K线，查找其中的一笔
 
     :param bars: 无包含关系K线列表
+    :param fxs: bars 中的分型列表，即 check_fxs(bars) 的结果；默认为 None，在函数内部计算
     :return:
     """
     min_bi_len = envs.get_min_bi_len()
-    fxs = check_fxs(bars)
+    fxs = check_fxs(bars) if fxs is None else fxs
     if len(fxs) < 2:
         return None, bars
 
@@ -165,8 +192,9 @@ def check_bi(bars: List[NewBar], **kwargs):
     if fx_b is None:
         return None, bars
 
-    bars_a = [x for x in bars if fx_a.elements[0].dt <= x.dt <= fx_b.elements[2].dt]
-    bars_b = [x for x in bars if x.dt >= fx_b.elements[0].dt]
+    # bars 按时间升序排列，二分查找切片位置，避免逐根比较
+    bars_a = bars[_bisect_dt(bars, fx_a.elements[0].dt):_bisect_dt(bars, fx_b.elements[2].dt, right=True)]
+    bars_b = bars[_bisect_dt(bars, fx_b.elements[0].dt):]
 
     # 判断fx_a和fx_b价格区间是否存在包含关系
     ab_include = (fx_a.high > fx_b.high and fx_a.low < fx_b.low) or (fx_a.high < fx_b.high and fx_a.low > fx_b.low)
@@ -195,14 +223,20 @@ class CZSC:
         self.verbose = envs.get_verbose()
         self.max_bi_num = max_bi_num
         self.bars_raw: List[RawBar] = []  # 原始K线序列
+        self._bars_raw_dt: List = []  # 原始K线时间序列，与 bars_raw 一一对应，用于二分查找
         self.bars_ubi: List[NewBar] = []  # 未完成笔的无包含K线序列
         self.bi_list: List[BI] = []
+        self._bi_fxs: List[FX] = []  # bi_list 中每一笔 fxs[1:] 的顺序拼接，用于 fx_list 的增量维护
+        # bars_ubi 前缀（不含最后一根）的极值缓存：(bars_ubi, 前缀长度, 最高NewBar, 最低NewBar, 最高RawBar, 最低RawBar)
+        self._ubi_extremes = (None, 0, None, None, None, None)
+        # bars_ubi 前缀（不含最后一根）的分型缓存：(bars_ubi, 前缀长度, 前缀中的分型列表)
+        self._ubi_fxs = (None, 0, [])
         self.symbol = bars[0].symbol
         self.freq = bars[0].freq
         self.get_signals = get_signals
         self.signals = None
         # cache 是信号计算过程的缓存容器，需要信号计算函数自行维护
-        self.cache = OrderedDict()
+        self.cache = dict()
 
         for bar in bars:
             self.update(bar)
@@ -218,7 +252,7 @@ class CZSC:
         # 查找笔
         if not self.bi_list:
             # 第一笔的查找
-            fxs = check_fxs(bars_ubi)
+            fxs = self.__get_ubi_fxs()
             if not fxs:
                 return
 
@@ -231,18 +265,20 @@ class CZSC:
             bars_ubi = [x for x in bars_ubi if x.dt >= fx_a.elements[0].dt]
 
             bi, bars_ubi_ = check_bi(bars_ubi)
-            if isinstance(bi, BI):
+            if bi is not None:
                 self.bi_list.append(bi)
+                self._bi_fxs.extend(bi.fxs[1:])
             self.bars_ubi = bars_ubi_
             return
 
         if self.verbose and len(bars_ubi) > 100:
             logger.info(f"{self.symbol} - {self.freq} - {bars_ubi[-1].dt} 未完成笔延伸数量: {len(bars_ubi)}")
 
-        bi, bars_ubi_ = check_bi(bars_ubi)
+        bi, bars_ubi_ = check_bi(bars_ubi, fxs=self.__get_ubi_fxs())
         self.bars_ubi = bars_ubi_
-        if isinstance(bi, BI):
+        if bi is not None:
             self.bi_list.append(bi)
+            self._bi_fxs.extend(bi.fxs[1:])
 
         # 后处理：如果当前笔被破坏，将当前笔的bars与bars_ubi进行合并，并丢弃
         last_bi = self.bi_list[-1]
@@ -253,6 +289,9 @@ class CZSC:
             # 必须是 -2，因为最后一根无包含K线有可能是未完成的
             self.bars_ubi = last_bi.bars[:-2] + [x for x in bars_ubi if x.dt >= last_bi.bars[-2].dt]
             self.bi_list.pop(-1)
+            n = len(last_bi.fxs[1:])
+            if n:
+                del self._bi_fxs[-n:]
 
     def update(self, bar: RawBar):
         """更新分析结果
@@ -262,11 +301,17 @@ class CZSC:
         # 更新K线序列
         if not self.bars_raw or bar.dt != self.bars_raw[-1].dt:
             self.bars_raw.append(bar)
+            self._bars_raw_dt.append(bar.dt)
             last_bars = [bar]
         else:
             # 当前 bar 是上一根 bar 的时间延伸
             self.bars_raw[-1] = bar
             last_bars = self.bars_ubi.pop(-1).raw_bars
+            if self._ubi_extremes[1] >= len(self.bars_ubi):
+                # 弹出后最后一根无包含K线可能被改写，极值缓存失效
+                self._ubi_extremes = (None, 0, None, None, None, None)
+            if self._ubi_fxs[1] >= len(self.bars_ubi):
+                self._ubi_fxs = (None, 0, [])
             assert bar.dt == last_bars[-1].dt, f"{bar.dt} != {last_bars[-1].dt}，时间错位"
             last_bars[-1] = bar
 
@@ -290,18 +335,20 @@ class CZSC:
         self.__update_bi()
 
         # 根据最大笔数量限制完成 bi_list, bars_raw 序列的数量控制
-        self.bi_list = self.bi_list[-self.max_bi_num:]
+        bi_list = self.bi_list[-self.max_bi_num:]
+        if len(bi_list) < len(self.bi_list):
+            n = sum(len(x.fxs[1:]) for x in self.bi_list[:len(self.bi_list) - len(bi_list)])
+            del self._bi_fxs[:n]
+        self.bi_list = bi_list
         if self.bi_list:
             sdt = self.bi_list[0].fx_a.elements[0].dt
-            s_index = 0
-            for i, bar in enumerate(self.bars_raw):
-                if bar.dt >= sdt:
-                    s_index = i
-                    break
-            self.bars_raw = self.bars_raw[s_index:]
+            s_index = bisect_left(self._bars_raw_dt, sdt)
+            if 0 < s_index < len(self.bars_raw):
+                self.bars_raw = self.bars_raw[s_index:]
+                self._bars_raw_dt = self._bars_raw_dt[s_index:]
 
         # 如果有信号计算函数，则进行信号计算
-        self.signals = self.get_signals(c=self) if self.get_signals else OrderedDict()
+        self.signals = self.get_signals(c=self) if self.get_signals else dict()
 
     def to_echarts(self, width: str = "1400px", height: str = '580px', bs=[]):
         """绘制K线分析图
@@ -326,10 +373,13 @@ class CZSC:
     def to_plotly(self):
         """使用 plotly 绘制K线分析图"""
         import pandas as pd
+        from operator import attrgetter
         from czsc.utils.plotly_plot import KlineChart
 
         bi_list = self.bi_list
-        df = pd.DataFrame(self.bars_raw)
+        # 一次取出绘图需要的列，避免 pd.DataFrame(dataclass列表) 逐个 asdict 深拷贝（含 cache）
+        columns = ['symbol', 'dt', 'open', 'close', 'high', 'low', 'vol', 'amount']
+        df = pd.DataFrame(map(attrgetter(*columns), self.bars_raw), columns=columns)
         kline = KlineChart(n_rows=3, title="{}-{}".format(self.symbol, self.freq.value))
         kline.add_kline(df, name="")
         kline.add_sma(df, ma_seq=(5, 10, 21), row=1, visible=True, line_width=1.2)
@@ -341,8 +391,9 @@ class CZSC:
             bi1 = [{'dt': x.fx_a.dt, "bi": x.fx_a.fx, "text": x.fx_a.mark.value} for x in bi_list]
             bi2 = [{'dt': bi_list[-1].fx_b.dt, "bi": bi_list[-1].fx_b.fx, "text": bi_list[-1].fx_b.mark.value[0]}]
             bi = pd.DataFrame(bi1 + bi2)
-            fx = pd.DataFrame([{'dt': x.dt, "fx": x.fx} for x in self.fx_list])
-            kline.add_scatter_indicator(fx['dt'], fx['fx'], name="分型", row=1, line_width=2)
+            fx_list = self.fx_list
+            kline.add_scatter_indicator([x.dt for x in fx_list], [x.fx for x in fx_list],
+                                        name="分型", row=1, line_width=2)
             kline.add_scatter_indicator(bi['dt'], bi['bi'], name="笔", text=bi['text'], row=1, line_width=2)
         return kline.fig
 
@@ -359,15 +410,65 @@ class CZSC:
         chart.render(file_html)
         webbrowser.open(file_html)
 
+    def __get_ubi_extremes(self):
+        """获取 bars_ubi 中的极值K线
+
+        bars_ubi 只会在末尾追加或改写最后一根，因此对除最后一根以外的前缀做增量缓存，
+        查询时只需要扫描新增的部分；bars_ubi 被整体替换时重新计算。
+
+        :return: (最高NewBar, 最低NewBar, 最高RawBar, 最低RawBar)，相同极值取最早出现的
+        """
+        bars_ubi = self.bars_ubi
+        ref, n, high_bar, low_bar, raw_high_bar, raw_low_bar = self._ubi_extremes
+        if ref is not bars_ubi:
+            n, high_bar, low_bar, raw_high_bar, raw_low_bar = 0, None, None, None, None
+
+        def __merge(bars, hb, lb, rhb, rlb):
+            for x in bars:
+                if hb is None or x.high > hb.high:
+                    hb = x
+                if lb is None or x.low < lb.low:
+                    lb = x
+                for y in x.raw_bars:
+                    if rhb is None or y.high > rhb.high:
+                        rhb = y
+                    if rlb is None or y.low < rlb.low:
+                        rlb = y
+            return hb, lb, rhb, rlb
+
+        if len(bars_ubi) - 1 > n:
+            high_bar, low_bar, raw_high_bar, raw_low_bar = __merge(bars_ubi[n:-1], high_bar, low_bar,
+                                                                   raw_high_bar, raw_low_bar)
+            n = len(bars_ubi) - 1
+        self._ubi_extremes = (bars_ubi, n, high_bar, low_bar, raw_high_bar, raw_low_bar)
+        return __merge(bars_ubi[n:], high_bar, low_bar, raw_high_bar, raw_low_bar)
+
+    def __get_ubi_fxs(self) -> List[FX]:
+        """获取 bars_ubi 中的分型，结果与 check_fxs(self.bars_ubi) 一致
+
+        与 __get_ubi_extremes 相同，对除最后一根以外的 bars_ubi 前缀缓存已经找到的分型，
+        每次只检查新增K线所在的位置。
+        """
+        bars_ubi = self.bars_ubi
+        ref, n, fxs = self._ubi_fxs
+        if ref is not bars_ubi:
+            n, fxs = 0, []
+
+        if len(bars_ubi) - 1 > n:
+            # 前缀中已经检查过中间位置 1 ~ n-2 的分型，从 n-1 开始继续检查
+            check_fxs(bars_ubi[max(n - 2, 0):len(bars_ubi) - 1], fxs)
+            n = len(bars_ubi) - 1
+        self._ubi_fxs = (bars_ubi, n, fxs)
+        return check_fxs(bars_ubi[max(n - 2, 0):], fxs.copy())
+
     @property
     def last_bi_extend(self):
         """判断最后一笔是否在延伸中，True 表示延伸中"""
-        if self.bi_list[-1].direction == Direction.Up \
-                and max([x.high for x in self.bars_ubi]) > self.bi_list[-1].high:
+        high_bar, low_bar, _, _ = self.__get_ubi_extremes()
+        if self.bi_list[-1].direction == Direction.Up and high_bar.high > self.bi_list[-1].high:
             return True
 
-        if self.bi_list[-1].direction == Direction.Down \
-                and min([x.low for x in self.bars_ubi]) < self.bi_list[-1].low:
+        if self.bi_list[-1].direction == Direction.Down and low_bar.low < self.bi_list[-1].low:
             return True
 
         return False
@@ -387,7 +488,7 @@ class CZSC:
         if not self.bars_ubi:
             return []
         else:
-            return check_fxs(self.bars_ubi)
+            return self.__get_ubi_fxs()
 
     @property
     def ubi(self):
@@ -398,8 +499,7 @@ class CZSC:
 
         bars_raw = [y for x in self.bars_ubi for y in x.raw_bars]
         # 获取最高点和最低点，以及对应的时间
-        high_bar = max(bars_raw, key=lambda x: x.high)
-        low_bar = min(bars_raw, key=lambda x: x.low)
+        _, _, high_bar, low_bar = self.__get_ubi_extremes()
         direction = Direction.Up if self.bi_list[-1].direction == Direction.Down else Direction.Down
 
         bi = {
@@ -419,9 +519,7 @@ class CZSC:
     @property
     def fx_list(self) -> List[FX]:
         """分型列表，包括 bars_ubi 中的分型"""
-        fxs = []
-        for bi_ in self.bi_list:
-            fxs.extend(bi_.fxs[1:])
+        fxs = self._bi_fxs.copy()
         ubi = self.ubi_fxs
         for x in ubi:
             if not fxs or x.dt > fxs[-1].dt:
@@ -5,6 +5,7 @@ email: zeng_bin8888@163.com
 create_dt: 2021/3/10 12:21
 describe: 常用对象结构
 """
+import sys
 import math
 import hashlib
 import numpy as np
@@ -18,6 +19,9 @@ from typing import List, Callable, Dict
 from czsc.enum import Mark, Direction, Freq, Operate
 from czsc.utils.corr import single_linear
 
+# Python 3.10 及以上版本，NewBar / FX / BI 这类高频创建的对象使用 slots，减少内存占用并加快属性访问
+_slots = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 
 @deprecated(version="1.0.0", reason="请使用 RawBar")
 @dataclass
@@ -60,7 +64,7 @@ class RawBar:
         return abs(self.open - self.close)
 
 
-@dataclass
+@dataclass(**_slots)
 class NewBar:
     """去除包含关系后的K线元素"""
 
@@ -82,7 +86,7 @@ class NewBar:
         return self.elements
 
 
-@dataclass
+@dataclass(**_slots)
 class FX:
     symbol: str
     dt: datetime
@@ -132,7 +136,8 @@ class FX:
     def power_volume(self):
         """成交量力度"""
         assert len(self.elements) == 3
-        return sum([x.vol for x in self.elements])
+        k1, k2, k3 = self.elements
+        return k1.vol + k2.vol + k3.vol
 
     @property
     def has_zs(self):
@@ -143,7 +148,7 @@ class FX:
         return zg >= zd
 
 
-@dataclass
+@dataclass(**_slots)
 class FakeBI:
     """虚拟笔：主要为笔的内部分析提供便利"""
 
@@ -197,7 +202,7 @@ def create_fake_bis(fxs: List[FX]) -> List[FakeBI]:
     return fake_bis
 
 
-@dataclass
+@dataclass(**_slots)
 class BI:
     symbol: str
     fx_a: FX    # 笔开始的分型
@@ -206,6 +211,8 @@ class BI:
     direction: Direction
     bars: List[NewBar] = field(default_factory=list)
     cache: dict = field(default_factory=dict)  # cache 用户缓存
+    sdt: datetime = field(init=False, repr=False, compare=False)
+    edt: datetime = field(init=False, repr=False, compare=False)
 
     def __post_init__(self):
         self.sdt = self.fx_a.dt
@@ -287,7 +294,7 @@ class BI:
     @property
     def power_volume(self):
         """成交量力度"""
-        return sum([x.vol for x in self.bars[1:-1]])
+        return sum(x.vol for x in self.bars[1:-1])
 
     @property
     def change(self):
@@ -357,12 +364,13 @@ class BI:
         return round(math.asin(self.power_price / self.hypotenuse) * 180 / 3.14, 2)
 
 
-@dataclass
+@dataclass(**_slots)
 class ZS:
     """中枢对象，主要用于辅助信号函数计算"""
 
     bis: List[BI]
     cache: dict = field(default_factory=dict)  # cache 用户缓存
+    symbol: str = field(init=False, repr=False, compare=False)
 
     def __post_init__(self):
         self.symbol = self.bis[0].symbol
@@ -415,15 +423,17 @@ class ZS:
     @property
     def is_valid(self):
         """中枢是否有效"""
-        if self.zg < self.zd:
+        # zg、zd 每次访问都要遍历前三笔，这里只计算一次
+        zg, zd = self.zg, self.zd
+        if zg < zd:
             return False
 
         for bi in self.bis:
             # 中枢内的笔必须与中枢的上下沿有交集
             if (
-                self.zg >= bi.high >= self.zd
-                or self.zg >= bi.low >= self.zd
-                or bi.high >= self.zg > self.zd >= bi.low
+                zg >= bi.high >= zd
+                or zg >= bi.low >= zd
+                or bi.high >= zg > zd >= bi.low
             ):
                 continue
             else:
@@ -3,7 +3,7 @@ import os
 import zipfile
 from tqdm import tqdm
 import pandas as pd
-from czsc.analyze import CZSC, RawBar, NewBar, remove_include, FX, check_fx, Direction, kline_pro
+from czsc.analyze import CZSC, RawBar, NewBar, remove_include, FX, check_fx, check_fxs, Direction, kline_pro
 from czsc.enum import Freq
 from collections import OrderedDict
 
@@ -90,3 +90,42 @@ def test_czsc_update():
     file_html = "x.html"
     chart.render(file_html)
     os.remove(file_html)
+
+
+def test_czsc_fx_list():
+    bars = read_daily()
+    c = CZSC(bars[:100], max_bi_num=20)
+    for bar in bars[100:]:
+        c.update(bar)
+        fxs = []
+        for bi in c.bi_list:
+            fxs.extend(bi.fxs[1:])
+        for x in c.ubi_fxs:
+            if not fxs or x.dt > fxs[-1].dt:
+                fxs.append(x)
+        assert [x.dt for x in c.fx_list] == [x.dt for x in fxs]
+
+
+def test_czsc_ubi_extremes():
+    from dataclasses import replace
+
+    bars = read_daily()
+    c = CZSC(bars[:100])
+    for bar in bars[100:1500]:
+        # 模拟同一根K线的多次更新
+        c.update(replace(bar, close=bar.open, high=bar.open, low=bar.open))
+        c.update(replace(bar, close=bar.open, high=max(bar.open, bar.low), low=bar.low))
+        c.update(bar)
+        assert [(x.dt, x.mark) for x in c.ubi_fxs] == [(x.dt, x.mark) for x in check_fxs(c.bars_ubi)]
+        if not c.bi_list:
+            continue
+
+        bars_raw = [y for x in c.bars_ubi for y in x.raw_bars]
+        if c.ubi:
+            assert c.ubi['high_bar'] is max(bars_raw, key=lambda x: x.high)
+            assert c.ubi['low_bar'] is min(bars_raw, key=lambda x: x.low)
+
+        last_bi = c.bi_list[-1]
+        extend = (last_bi.direction == Direction.Up and max(x.high for x in c.bars_ubi) > last_bi.high) \
+            or (last_bi.direction == Direction.Down and min(x.low for x in c.bars_ubi) < last_bi.low)
+        assert c.last_bi_extend == extend